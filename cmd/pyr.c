@@ -91,6 +91,12 @@ static struct {
         char *path;
         char const *py;
         bool signal_tb;
+        bool watch;
+        char const *cache;
+        char const **cache_inputs;
+        int cache_inputs_len;
+        char const *cache_size;
+        char const *control;
         char const *interact;
         bool module;
     // Python options
@@ -164,6 +170,27 @@ static int handle_option(char const *name, char const *value, void *data) {
         if (value) fatal(64, "unexpected value for option %s", name);
         opts.signal_tb = true;
         }
+    OPT("watch") {
+        if (value) fatal(64, "unexpected value for option %s", name);
+        opts.watch = true;
+        }
+    OPT("cache") {
+        if (!value) fatal(64, "missing value for option %s", name);
+        opts.cache = value;
+        }
+    OPT("cache-size") {
+        if (!value) fatal(64, "missing value for option %s", name);
+        opts.cache_size = value;
+        }
+    OPT("cache-input") {
+        if (!value) fatal(64, "missing value for option %s", name);
+        opts.cache_inputs = realloc(opts.cache_inputs, sizeof(char*) * (opts.cache_inputs_len + 1));
+        opts.cache_inputs[opts.cache_inputs_len++] = value;
+        }
+    OPT("control") {
+        if (!value) fatal(64, "missing value for option %s", name);
+        opts.control = value;
+        }
     OPT("interact") {
         if (!value) fatal(64, "missing value for option %s", name);
         opts.interact = value;
@@ -296,6 +323,16 @@ int main(int argc, char **argv) {
         );
     push_arg(py3_dir(self));
     push_arg(opts.signal_tb ? "true" : "false");
+    push_arg(opts.watch ? "true" : "false");
+    push_arg(opts.cache ? opts.cache : "");
+    char cache_inputs_len[16];
+    snprintf(cache_inputs_len, sizeof cache_inputs_len, "%d", opts.cache_inputs_len);
+    push_arg(cache_inputs_len);
+    for (int i = 0; i != opts.cache_inputs_len; ++i) {
+        push_arg(opts.cache_inputs[i]);
+        }
+    push_arg(opts.cache_size ? opts.cache_size : "");
+    push_arg(opts.control ? opts.control : "");
     push_arg(opts.path ? opts.path : "");
     push_arg(opts.site ? opts.site : "");
     if (argc == 0 || strcmp(argv[0], "-") == 0) {
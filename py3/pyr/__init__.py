@@ -1,5 +1,6 @@
 # code must be compatible across all supported Python versions
 
+import _thread
 import errno
 import importlib
 import os
@@ -161,6 +162,8 @@ def _print_exception():
     ty, val, tb = sys.exc_info()
     tb = tb.tb_next
     for _ in range(_print_exception.extra_skips):
+        if tb is None:
+            break
         tb = tb.tb_next
     traceback.print_exception(ty, val, tb)
 _print_exception.extra_skips = 0
@@ -213,15 +216,17 @@ def _bootstrap_setup():
     site_dirs = site_dirs.split(",") if site_dirs else []
     _append_site(site_dirs)
 
-    target = sys.argv.pop(0)
-    if target == "__file__":
-        target = _get_execfile(sys.argv.pop(0))
+    name = sys.argv.pop(0)
+    if name == "__file__":
+        path = sys.argv.pop(0)
+        target = _get_execfile(path)
     else:
-        target = _get_target(target)
+        path = None
+        target = _get_target(name)
     set_command_name(os.path.basename(sys.argv[0]))
     args = sys.argv[1:]
     opts = list(pop_opts(args))
-    return target, opts, args
+    return target, opts, args, (dirs, name, path)
 def _get_execfile(path):
     _print_exception.extra_skips += 1
     def target(opts, args):
@@ -259,45 +264,140 @@ def _get_target(target):
             sys.stderr.write("pyr AttributeError: {}\n".format(e))
             sys.exit(70)
     return target
-def _bootstrap():
-    signal_tb = (sys.argv.pop(0) == "true")
-    exit = None
-    try:
-        target, opts, args = _bootstrap_setup()
-        exit = target(opts, args)
-        if not exit:
-            if sys.stdout is not None:
-                sys.stdout.flush()
-            if sys.stderr is not None:
-                sys.stderr.flush()
-        raise SystemExit(exit)
-
-    except KeyboardInterrupt:
+def _loaded_modules(dirs):
+    """return {module name: filename} for loaded modules under dirs"""
+    prefixes = tuple(os.path.join(x, "") for x in dirs)
+    modules = {}
+    if not prefixes:
+        return modules
+    for name, module in list(sys.modules.items()):
+        filename = getattr(module, "__file__", None)
+        if filename and filename.startswith(prefixes):
+            modules[name] = filename
+    return modules
+def _exit_code(e, signal_tb):
+    """return exit code for exception e, which must be currently handled"""
+    if isinstance(e, KeyboardInterrupt):
         if signal_tb:
             _print_exception()
-        exit = 128 + signal.SIGINT
-    except SystemExit as e:
+        return 128 + signal.SIGINT
+    elif isinstance(e, SystemExit):
         exit = e.code
         if not isinstance(exit, (int, type(None))):
             print_error(exit)
             exit = Exit.codes["unknown"]
+        return exit
 
-    except BrokenPipeError as e:
+    elif isinstance(e, BrokenPipeError):
         if signal_tb:
             _print_exception()
-        exit = 128 + signal.SIGPIPE
-    except IOError as e:
+        return 128 + signal.SIGPIPE
+    elif isinstance(e, IOError):
         _print_exception()
-        exit = Exit.codes["io"]
-    except OSError as e:
+        return Exit.codes["io"]
+    elif isinstance(e, OSError):
         _print_exception()
-        exit = Exit.codes["os"]
-    except BaseException:
+        return Exit.codes["os"]
+    else:
         _print_exception()
-        exit = Exit.codes["internal"]
+        return Exit.codes["internal"]
+def _run(target, opts, args, signal_tb=False):
+    """call target(opts, args) and return exit code, as _bootstrap would"""
+    try:
+        exit = target(opts, args)
+        if not exit:
+            if sys.stdout is not None:
+                sys.stdout.flush()
+            if sys.stderr is not None:
+                sys.stderr.flush()
+        raise SystemExit(exit)
+    except BaseException as e:
+        return _exit_code(e, signal_tb)
+class _ThreadStreams(object):
+    """stand-in for sys.stdout or sys.stderr, forwarding to the stream set for the current thread, else to default"""
+    def __init__(self, default):
+        self.default = default
+        self.streams = {}
+    def __getattr__(self, name):
+        stream = self.streams.get(_thread.get_ident(), self.default)
+        return getattr(stream, name)
+_streams_lock = _thread.allocate_lock()
+def _set_thread_stream(name, stream):
+    """send the current thread's use of sys.<name> to stream, or stop if stream is None
+
+    A _ThreadStreams replaces sys.<name> only while some thread has a stream set.  Nothing is changed if sys.<name> is None.
+    """
+    with _streams_lock:
+        current = getattr(sys, name)
+        if stream is not None:
+            if current is None:
+                return
+            if not isinstance(current, _ThreadStreams):
+                current = _ThreadStreams(current)
+                setattr(sys, name, current)
+            current.streams[_thread.get_ident()] = stream
+        elif isinstance(current, _ThreadStreams):
+            current.streams.pop(_thread.get_ident(), None)
+            if not current.streams:
+                setattr(sys, name, current.default)
+def _get_stream(name):
+    """return sys.<name>, or what it forwards to for threads without their own stream"""
+    with _streams_lock:
+        current = getattr(sys, name)
+        if isinstance(current, _ThreadStreams):
+            return current.default
+        return current
+def _replace_stream(name, stream):
+    """set sys.<name> to stream, keeping streams set for other threads"""
+    with _streams_lock:
+        current = getattr(sys, name)
+        if isinstance(current, _ThreadStreams):
+            current.default = stream
+        else:
+            setattr(sys, name, stream)
+def _bootstrap():
+    signal_tb = (sys.argv.pop(0) == "true")
+    watching = (sys.argv.pop(0) == "true")
+    cache_dir = sys.argv.pop(0)
+    cache_inputs = [sys.argv.pop(0) for _ in range(int(sys.argv.pop(0)))]
+    cache_size = sys.argv.pop(0)
+    if cache_size:
+        if not all(c in "0123456789" for c in cache_size):
+            sys.stderr.write("pyr error: expected non-negative integer for option --cache-size\n")
+            sys.exit(64)
+        cache_size = int(cache_size)
+    control_path = sys.argv.pop(0)
+    server = None
+    exit = None
+    try:
+        target, opts, args, source = _bootstrap_setup()
+        if control_path:
+            from . import control
+            names = {"opts": opts, "args": args, "target": target}
+            server = control.serve(control_path, names)
+        if cache_dir and not watching:
+            from . import cache
+            if cache_size == "":
+                cache_size = cache.MAX_SIZE
+            target = cache.cached(target, source, cache_dir, cache_inputs, cache_size, signal_tb)
+        if watching:
+            from . import watch
+            exit = watch.watch(target, opts, args, source, signal_tb)
+        else:
+            exit = target(opts, args)
+        if not exit:
+            if sys.stdout is not None:
+                sys.stdout.flush()
+            if sys.stderr is not None:
+                sys.stderr.flush()
+        raise SystemExit(exit)
+    except BaseException as e:
+        exit = _exit_code(e, signal_tb)
 
     finally:
         try:
+            if server is not None:
+                server.close()
             if sys.stdout is not None:
                 sys.stdout.flush()
         finally:
@@ -0,0 +1,214 @@
+"""replay recorded results of pure targets"""
+# code must be compatible across all supported Python versions
+
+import errno
+import fcntl
+import hashlib
+import io
+import marshal
+import os
+import stat
+import sys
+import tempfile
+
+from . import (Exit, _get_stream, _loaded_modules, _replace_stream, _run,
+    print_warning)
+
+
+MAX_SIZE = 64 * 1024 * 1024
+VERSION = 1
+
+_uncached_exits = set(Exit.codes[x] for x in ("internal", "os", "io", "tempfail"))
+
+def cached(target, source, cache_dir, inputs=(), max_size=MAX_SIZE, signal_tb=False):
+    """return target replaying stdout, stderr, and exit code from cache_dir
+
+    Results are keyed on target, sys.argv[0], current directory, opts, args, stdin, contents of inputs, and contents of loaded modules under source dirs (including any imported while running).  Stdin that is a regular file or os.devnull is read completely before running target, which then reads the same data from memory; a terminal stdin is neither read nor keyed, and any other stdin, such as a pipe, runs target without the cache.  Exits from signals, internal errors, and OS/IO errors are not recorded.  Entries are evicted, least recently used first, when cache_dir exceeds max_size bytes.
+    """
+    dirs, name, path = source
+    def cached_target(opts, args):
+        if sys.stdout is None or sys.stderr is None:
+            return _run(target, opts, args, signal_tb)
+        stdin = sys.stdin
+        data = None
+        if stdin is not None and not stdin.isatty():
+            # reading a pipe to EOF could block forever
+            if not _is_file(stdin):
+                return _run(target, opts, args, signal_tb)
+            data = stdin.buffer.read()
+        key = _key(source, opts, args, data, inputs)
+        entry = _load(cache_dir, key)
+        if entry is not None:
+            return _replay(entry)
+        chunks = []
+        # threads with their own streams, such as control consoles, are not recorded
+        stdout, stderr = _get_stream("stdout"), _get_stream("stderr")
+        if data is not None:
+            sys.stdin = io.TextIOWrapper(io.BytesIO(data),
+                encoding=stdin.encoding, errors=stdin.errors)
+        tee_stdout = _tee(stdout, 1, chunks)
+        tee_stderr = _tee(stderr, 2, chunks)
+        _replace_stream("stdout", tee_stdout)
+        _replace_stream("stderr", tee_stderr)
+        try:
+            exit = _run(target, opts, args, signal_tb)
+        finally:
+            try:
+                tee_stdout.flush()
+                tee_stderr.flush()
+            finally:
+                sys.stdin = stdin
+                _replace_stream("stdout", stdout)
+                _replace_stream("stderr", stderr)
+        if exit is None:
+            exit = 0
+        if isinstance(exit, int) and exit < 128 and exit not in _uncached_exits:
+            modules = _module_digests(dirs, name, path)
+            try:
+                _store(cache_dir, key, (VERSION, exit, _merge(chunks), modules), max_size)
+            except (IOError, OSError) as e:
+                print_warning("cannot store cache entry:", e)
+        return exit
+    return cached_target
+
+def _is_file(stream):
+    """return True if stream is a regular file or os.devnull"""
+    try:
+        st = os.fstat(stream.fileno())
+    except (IOError, OSError, ValueError):
+        return False
+    if stat.S_ISREG(st.st_mode):
+        return True
+    null = os.stat(os.devnull)
+    return (st.st_dev, st.st_ino) == (null.st_dev, null.st_ino)
+def _digest(filename):
+    h = hashlib.sha256()
+    try:
+        with open(filename, "rb") as f:
+            for data in iter(lambda: f.read(65536), b""):
+                h.update(data)
+    except (IOError, OSError):
+        return ""
+    return h.hexdigest()
+def _module_digests(dirs, name, path):
+    files = set(_loaded_modules(dirs).values())
+    if name == "__file__":
+        files.add(path)
+    return dict((x, _digest(x)) for x in files)
+def _key(source, opts, args, stdin, inputs):
+    dirs, name, path = source
+    h = hashlib.sha256()
+    def add(*values):
+        for x in values:
+            h.update(repr(x).encode("utf-8", "surrogateescape"))
+            h.update(b"\0")
+    add(VERSION, sys.version, sys.argv[0], os.getcwd(), name, path, opts, args)
+    add(stdin is None, hashlib.sha256(stdin or b"").hexdigest())
+    for x in inputs:
+        add(x, _digest(x))
+    add(sorted(_module_digests(dirs, name, path).items()))
+    return h.hexdigest()
+
+def _load(cache_dir, key):
+    """return entry for key, or None"""
+    filename = os.path.join(cache_dir, key)
+    try:
+        with open(filename, "rb") as f:
+            entry = marshal.load(f)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(entry, tuple) or len(entry) != 4 or entry[0] != VERSION:
+        return None
+    for x, digest in entry[3].items():
+        if _digest(x) != digest:
+            return None
+    try:
+        os.utime(filename, None)
+    except OSError:
+        pass
+    return entry
+def _replay(entry):
+    _, exit, chunks, _ = entry
+    streams = {1: sys.stdout, 2: sys.stderr}
+    last = None
+    for fd, data in chunks:
+        f = streams[fd]
+        if f is not last:
+            if last is not None:
+                last.flush()
+            last = f
+        f.buffer.write(data)
+    if last is not None:
+        last.flush()
+    return exit
+def _merge(chunks):
+    merged = []
+    for fd, data in chunks:
+        if merged and merged[-1][0] == fd:
+            merged[-1][1].append(data)
+        else:
+            merged.append((fd, [data]))
+    return [(fd, b"".join(data)) for fd, data in merged]
+def _store(cache_dir, key, entry, max_size=MAX_SIZE):
+    try:
+        os.makedirs(cache_dir)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    fd, tmp = tempfile.mkstemp(prefix=".tmp.", dir=cache_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            marshal.dump(entry, f)
+        os.rename(tmp, os.path.join(cache_dir, key))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    _evict(cache_dir, max_size)
+def _evict(cache_dir, max_size=MAX_SIZE):
+    """remove least recently used entries until under max_size bytes"""
+    with open(os.path.join(cache_dir, ".lock"), "ab") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        entries = []
+        total = 0
+        for x in os.listdir(cache_dir):
+            if x.startswith("."):
+                continue
+            x = os.path.join(cache_dir, x)
+            try:
+                st = os.stat(x)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, x))
+            total += st.st_size
+        entries.sort()
+        for _, size, x in entries:
+            if total <= max_size:
+                break
+            try:
+                os.unlink(x)
+            except OSError:
+                pass
+            total -= size
+
+class _Tee(io.RawIOBase):
+    """write to buffer while recording (fd, data) chunks"""
+    def __init__(self, buffer, fd, chunks):
+        self._buffer = buffer
+        self._fd = fd
+        self._chunks = chunks
+    def writable(self):
+        return True
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append((self._fd, data))
+        self._buffer.write(data)
+        return len(data)
+    def flush(self):
+        self._buffer.flush()
+    def fileno(self):
+        return self._buffer.fileno()
+def _tee(stream, fd, chunks):
+    stream.flush()
+    return io.TextIOWrapper(_Tee(stream.buffer, fd, chunks),
+        encoding=stream.encoding, errors=stream.errors,
+        line_buffering=stream.line_buffering, write_through=True)
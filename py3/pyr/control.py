@@ -0,0 +1,242 @@
+"""introspect a running process through a unix socket"""
+# code must be compatible across all supported Python versions
+
+import code
+import collections
+import contextlib
+import errno
+import gc
+import os
+import select
+import socket
+import stat
+import sys
+import threading
+import traceback
+
+from . import Exit, _set_thread_stream, optics
+
+
+def main(opts, args):
+    """ % SOCKET [COMMAND [ARG..]]
+
+    Send COMMAND (default: help) to a process started with --control=SOCKET and relay stdin and stdout until either closes.  Exits with usage error if the process rejects COMMAND.
+    """
+    if opts:
+        raise optics.unknown_option(opts[0][0])
+    if not args:
+        raise optics.missing_arg("SOCKET")
+    path = args.pop(0)
+    request = " ".join(args or ["help"])
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (IOError, OSError) as e:
+        raise Exit("unavailable", "cannot connect to", path + ":", e.strerror or e)
+    with contextlib.closing(sock):
+        sock.sendall(request.encode("utf-8") + b"\n")
+        status = _recv_line(sock).decode("utf-8", "replace").rstrip("\n")
+        if status.startswith("error "):
+            raise Exit("usage", status[len("error "):])
+        if status != "ok":
+            raise Exit("unavailable", "unexpected reply from", path + ":", repr(status))
+        out = sys.stdout.buffer
+        stdin = sys.stdin.fileno() if sys.stdin is not None else None
+        while True:
+            readers = [sock] if stdin is None else [sock, stdin]
+            for x in select.select(readers, [], [])[0]:
+                if x is sock:
+                    data = sock.recv(65536)
+                    if not data:
+                        return
+                    out.write(data)
+                    out.flush()
+                else:
+                    data = os.read(stdin, 65536)
+                    if data:
+                        sock.sendall(data)
+                    else:
+                        sock.shutdown(socket.SHUT_WR)
+                        stdin = None
+
+def serve(path, names=None):
+    """listen on unix socket path from a daemon thread, return Server
+
+    The socket is created accessible only to the current user.  Each connection sends one command line; see Server.commands.  The console command runs code.InteractiveConsole over the connection with names (plus sys and threading) as its namespace.  It is not restricted: any code runs, as the current user, so the socket's permissions are the only access control.  While any console is connected, sys.stdout and sys.stderr are replaced to send output from each console's thread to its connection and all other output to the original streams.
+    """
+    server = Server(path, names)
+    thread = threading.Thread(target=server.serve, name="pyr.control")
+    thread.daemon = True
+    thread.start()
+    return server
+
+class Server(object):
+    def __init__(self, path, names=None):
+        self.path = path
+        self.names = dict(names or {})
+        self.names.setdefault("sys", sys)
+        self.names.setdefault("threading", threading)
+        self.sock = _bind(path)
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except (IOError, OSError):
+                return
+            thread = threading.Thread(target=self.handle, args=(conn,), name="pyr.control")
+            thread.daemon = True
+            thread.start()
+    def close(self):
+        """stop serving and remove socket"""
+        sock, self.sock = self.sock, None
+        if sock is None:
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except (IOError, OSError):
+            pass
+        sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def handle(self, conn):
+        rfile = conn.makefile("r", encoding="utf-8", errors="replace")
+        wfile = conn.makefile("w", encoding="utf-8", errors="replace")
+        with contextlib.closing(conn), contextlib.closing(rfile), contextlib.closing(wfile):
+            try:
+                words = rfile.readline().split()
+                command = self.commands.get(words[0] if words else "help")
+                # first line of every reply is "ok" or "error MESSAGE"
+                if command is None:
+                    wfile.write("error unknown command {!r}\n".format(words[0]))
+                else:
+                    wfile.write("ok\n")
+                    command(self, rfile, wfile, *words[1:])
+                wfile.flush()
+            except (IOError, OSError):
+                pass
+            except Exception:
+                traceback.print_exc(file=wfile)
+                wfile.flush()
+
+    commands = {}
+    def _command(f, commands=commands):
+        commands[f.__name__] = f
+        return f
+
+    @_command
+    def help(self, rfile, wfile):
+        """list commands"""
+        for name, f in sorted(self.commands.items()):
+            wfile.write("{:10} {}\n".format(name, f.__doc__))
+    @_command
+    def stacks(self, rfile, wfile):
+        """show stack of every thread"""
+        frames = sys._current_frames()
+        for thread in threading.enumerate():
+            wfile.write("Thread {!r} ident={} daemon={} alive={}\n".format(
+                thread.name, thread.ident, thread.daemon, thread.is_alive()))
+            frame = frames.get(thread.ident)
+            if frame is not None:
+                wfile.write("".join(traceback.format_stack(frame)))
+            wfile.write("\n")
+        # frames includes this frame
+        frames = frame = None
+    @_command
+    def gc(self, rfile, wfile):
+        """show garbage collector and memory summary"""
+        wfile.write("enabled: {}\n".format(gc.isenabled()))
+        wfile.write("counts: {}\n".format(gc.get_count()))
+        wfile.write("thresholds: {}\n".format(gc.get_threshold()))
+        for n, stats in enumerate(gc.get_stats()):
+            wfile.write("generation {}: {}\n".format(n, stats))
+        wfile.write("tracked objects: {}\n".format(len(gc.get_objects())))
+        wfile.write("uncollectable: {}\n".format(len(gc.garbage)))
+        try:
+            import resource
+        except ImportError:
+            pass
+        else:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            wfile.write("max rss: {}\n".format(usage.ru_maxrss))
+    @_command
+    def objects(self, rfile, wfile, count="20"):
+        """[N] show N most common types of tracked objects"""
+        counts = collections.Counter(type(x).__name__ for x in gc.get_objects())
+        for name, n in counts.most_common(int(count)):
+            wfile.write("{:10d} {}\n".format(n, name))
+    @_command
+    def console(self, rfile, wfile):
+        """run interactive console"""
+        for name in ("stdout", "stderr"):
+            _set_thread_stream(name, wfile)
+        try:
+            _Console(self.names, rfile, wfile).interact(banner="", exitmsg="")
+        finally:
+            for name in ("stdout", "stderr"):
+                _set_thread_stream(name, None)
+
+    del _command
+
+class _Console(code.InteractiveConsole):
+    def __init__(self, names, rfile, wfile):
+        code.InteractiveConsole.__init__(self, dict(names))
+        self.rfile = rfile
+        self.wfile = wfile
+    def raw_input(self, prompt=""):
+        self.write(prompt)
+        line = self.rfile.readline()
+        if not line:
+            raise EOFError
+        return line.rstrip("\n")
+    def write(self, data):
+        self.wfile.write(data)
+        self.wfile.flush()
+    def runcode(self, code_obj):
+        try:
+            code.InteractiveConsole.runcode(self, code_obj)
+        finally:
+            self.wfile.flush()
+
+def _bind(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o077)
+    try:
+        try:
+            sock.bind(path)
+        except (IOError, OSError) as e:
+            if e.errno != errno.EADDRINUSE or not _stale(path):
+                raise
+            # connect also fails with ECONNREFUSED for files which are not sockets
+            if not stat.S_ISSOCK(os.lstat(path).st_mode):
+                raise
+            os.unlink(path)
+            sock.bind(path)
+    except (IOError, OSError) as e:
+        sock.close()
+        raise Exit("unavailable", "cannot bind control socket", path + ":", e.strerror or e)
+    finally:
+        os.umask(umask)
+    sock.listen(5)
+    return sock
+def _stale(path):
+    """return True if nothing accepts connections on path"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (IOError, OSError) as e:
+        return e.errno == errno.ECONNREFUSED
+    finally:
+        sock.close()
+    return False
+def _recv_line(sock):
+    line = b""
+    while not line.endswith(b"\n"):
+        data = sock.recv(1)
+        if not data:
+            break
+        line += data
+    return line
@@ -0,0 +1,88 @@
+"""run targets in-process as cmd/pyr would, for fast command tests"""
+# code must be compatible across all supported Python versions
+
+import io
+import os
+import sys
+
+from . import (_exit_code, _get_execfile, _get_target, _print_exception, _run,
+    pop_opts, set_command_name)
+
+
+_prefixes = ("_error_prefix", "_other_prefix")
+
+def run(target, args=(), file=False, prog=None, stdin=b"", signal_tb=False):
+    """call target with args and return (exit, stdout, stderr)
+
+    Like "pyr -m TARGET ARG.." (or "pyr TARGET ARG.." if file is true), with sys.argv[0] as prog (default: target).  Options are parsed from args with pop_opts.  Stdin, stdout, and stderr are bytes.  Exit is the code _bootstrap would exit with, including for Exit, signal exceptions, IOError/OSError, and failures resolving target.
+
+    Directories for --path must already be in sys.path.  Modules imported by target remain loaded afterwards.
+    """
+    # set_command_name stores prefixes as package globals
+    package = sys.modules[__package__]
+    argv = [prog or target]
+    argv.extend(args)
+    out = _Output()
+    err = _Output()
+    saved = sys.argv, sys.stdin, sys.stdout, sys.stderr, _print_exception.extra_skips
+    prefixes = dict((x, package.__dict__.get(x)) for x in _prefixes)
+    sys.argv = argv
+    sys.stdin = io.TextIOWrapper(io.BytesIO(stdin))
+    sys.stdout = io.TextIOWrapper(out)
+    sys.stderr = io.TextIOWrapper(err, line_buffering=True)
+    try:
+        try:
+            if file:
+                target = _get_execfile(target)
+            else:
+                target = _get_target(target)
+            set_command_name(os.path.basename(argv[0]))
+            args = argv[1:]
+            opts = list(pop_opts(args))
+        except BaseException as e:
+            exit = _exit_code(e, signal_tb)
+        else:
+            exit = _run(target, opts, args, signal_tb)
+        for f in (sys.stdout, sys.stderr):
+            if f is not None and not f.closed:
+                f.flush()
+    finally:
+        sys.argv, sys.stdin, sys.stdout, sys.stderr, _print_exception.extra_skips = saved
+        for x, value in prefixes.items():
+            if value is None:
+                package.__dict__.pop(x, None)
+            else:
+                setattr(package, x, value)
+    return exit or 0, out.getvalue(), err.getvalue()
+
+def run_all(cases, jobs=None):
+    """return list of run(*case) for each case, across jobs forked workers
+
+    Jobs defaults to os.cpu_count().  With one job, cases run in this process.  Workers are forked, so they share modules already imported here.
+    """
+    cases = list(cases)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(cases))
+    if jobs <= 1:
+        return [run(*x) for x in cases]
+    import multiprocessing
+    pool = multiprocessing.get_context("fork").Pool(jobs)
+    try:
+        return pool.map(_run_case, cases, chunksize=max(1, len(cases) // (jobs * 4)))
+    finally:
+        pool.close()
+        pool.join()
+def _run_case(case):
+    return run(*case)
+
+class _Output(io.BytesIO):
+    """BytesIO keeping its value when closed by target"""
+    def close(self):
+        if not self.closed:
+            self._value = io.BytesIO.getvalue(self)
+        io.BytesIO.close(self)
+    def getvalue(self):
+        if self.closed:
+            return self._value
+        return io.BytesIO.getvalue(self)
@@ -0,0 +1,213 @@
+"""rerun a target in the same interpreter whenever its source changes"""
+# code must be compatible across all supported Python versions
+
+import ast
+import importlib
+import os
+import select
+import signal
+import sys
+import time
+import traceback
+
+from . import _get_target, _loaded_modules, _print_exception, _run, print_warning
+
+
+POLL_INTERVAL = 0.5
+SETTLE_DELAY = 0.05
+
+_stop_codes = set(128 + x for x in (signal.SIGINT, signal.SIGHUP, signal.SIGTERM))
+
+def watch(target, opts, args, source, signal_tb=False):
+    """run target(opts, args) again after each change; return last exit code
+
+    Source is (dirs, name, path) from _bootstrap_setup.  Loaded modules with files under dirs are watched, as is path for "__file__" targets.  Changed modules and modules depending on them are reloaded, then target is resolved again from name.  Other modules stay loaded.
+
+    Exits due to SIGINT, SIGHUP, or SIGTERM stop watching.
+    """
+    dirs, name, path = source
+    modules, files = _watched(dirs, name, path)
+    before = _mtimes(files)
+    while True:
+        # execfile targets only undo their skips when module code succeeds
+        skips = _print_exception.extra_skips
+        exit = _run(target, list(opts), list(args), signal_tb)
+        _print_exception.extra_skips = skips
+        for f in (sys.stdout, sys.stderr):
+            if f is not None:
+                f.flush()
+        if exit in _stop_codes:
+            return exit
+        if exit:
+            print_warning("exit", exit)
+        while True:
+            modules, files = _watched(dirs, name, path)
+            changed = _wait(files, before)
+            # changes from here on, including while reloading or running, are seen by the next _wait
+            before = _mtimes(files)
+            # execfile targets read path on every call
+            rerun = name == "__file__" and path in changed
+            changed = set(x for x, f in modules.items() if f in changed)
+            if changed:
+                if not _reload(changed, modules):
+                    continue
+                rerun = True
+            if not rerun:
+                continue
+            if name != "__file__":
+                try:
+                    target = _get_target(name)
+                except SystemExit:
+                    continue
+            break
+
+def _watched(dirs, name, path):
+    """return (modules, files) to watch"""
+    modules = _loaded_modules(dirs)
+    files = set(modules.values())
+    if name == "__file__":
+        files.add(path)
+    return modules, files
+def _mtimes(files):
+    mtimes = {}
+    for x in files:
+        try:
+            mtimes[x] = os.stat(x).st_mtime_ns
+        except OSError:
+            mtimes[x] = None
+    return mtimes
+def _wait(files, before):
+    """block until any of files differs from before, then return set of changed files
+
+    Files missing from before, such as modules first imported by the last run, use their current mtime.
+    """
+    before = dict(before)
+    for x, mtime in _mtimes(set(files) - set(before)).items():
+        before[x] = mtime
+    inotify = _Inotify.open(set(os.path.dirname(x) for x in files))
+    try:
+        while True:
+            after = _mtimes(files)
+            changed = set(x for x in files if before[x] != after[x])
+            if changed:
+                return changed
+            if inotify:
+                inotify.wait()
+                time.sleep(SETTLE_DELAY)
+            else:
+                time.sleep(POLL_INTERVAL)
+    finally:
+        if inotify:
+            inotify.close()
+
+class _Inotify(object):
+    """minimal Linux inotify through ctypes, watching directories"""
+    IN_CLOEXEC = 0o2000000
+    # IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    MASK = 0x002 | 0x008 | 0x080 | 0x100 | 0x200
+    _libc = False
+
+    @classmethod
+    def open(cls, dirs):
+        """return new instance, or None if inotify is unavailable"""
+        if cls._libc is False:
+            cls._libc = None
+            try:
+                import ctypes
+                libc = ctypes.CDLL(None, use_errno=True)
+                libc.inotify_init1, libc.inotify_add_watch
+            except (ImportError, OSError, AttributeError):
+                pass
+            else:
+                cls._libc = libc
+        if cls._libc is None:
+            return None
+        fd = cls._libc.inotify_init1(cls.IN_CLOEXEC)
+        if fd < 0:
+            return None
+        self = cls(fd)
+        for x in dirs:
+            if cls._libc.inotify_add_watch(fd, os.fsencode(x), cls.MASK) < 0:
+                self.close()
+                return None
+        return self
+    def __init__(self, fd):
+        self.fd = fd
+    def wait(self):
+        select.select([self.fd], [], [])
+        os.read(self.fd, 65536)
+    def close(self):
+        os.close(self.fd)
+
+def _imports(name, filename, names):
+    """return set of modules, from names, which name's source imports, or None if unknown"""
+    try:
+        with open(filename, "rb") as f:
+            tree = ast.parse(f.read(), filename)
+    except (IOError, OSError, SyntaxError, ValueError):
+        return None
+    if os.path.basename(filename).startswith("__init__."):
+        package = name
+    else:
+        package = name.rpartition(".")[0]
+    found = set()
+    def add(module):
+        parts = module.split(".")
+        for n in range(1, len(parts) + 1):
+            found.add(".".join(parts[:n]))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for x in node.names:
+                add(x.name)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                parts = package.split(".") if package else []
+                if node.level - 1 > len(parts):
+                    continue
+                parts = parts[:len(parts) - (node.level - 1)]
+                base = ".".join(parts + ([base] if base else []))
+            if base:
+                add(base)
+            for x in node.names:
+                add(base + "." + x.name if base else x.name)
+    found.discard(name)
+    return found & set(names)
+def _reload(changed, modules):
+    """reload changed modules and their dependents, return True on success
+
+    Dependents are found from import statements in each module's source.  A module whose source cannot be parsed is treated as depending on every other module.
+    """
+    deps = {}
+    for name, filename in modules.items():
+        found = _imports(name, filename, modules)
+        deps[name] = set(modules) - set([name]) if found is None else found
+    reload = set(changed)
+    while True:
+        more = set(x for x, d in deps.items() if x not in reload and d & reload)
+        if not more:
+            break
+        reload |= more
+    order = []
+    seen = set()
+    def visit(name):
+        if name in seen:
+            return
+        seen.add(name)
+        for x in sorted(deps[name] & reload):
+            visit(x)
+        order.append(name)
+    for name in sorted(reload):
+        visit(name)
+    for name in order:
+        module = sys.modules.get(name)
+        if module is None:
+            continue
+        try:
+            importlib.reload(module)
+        except BaseException as e:
+            if isinstance(e, (KeyboardInterrupt, SystemExit)):
+                raise
+            traceback.print_exc()
+            return False
+    return True